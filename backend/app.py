@@ -1,10 +1,14 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
+import hmac
+import math
 import os
-from youtube_utils import extract_video_info, get_transcript, download_thumbnail, upscale_thumbnail
+from youtube_utils import extract_video_id, extract_video_info, get_transcript, download_thumbnail, upscale_thumbnail
 from summarizer import generate_summary, translate_text
+from storage_manager import ThumbnailStorage
 
-app = Flask(__name__, static_folder='static')
+# Static files are served by serve_static below so thumbnail hits are tracked
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
 # Configuration for production
@@ -28,6 +32,51 @@ else:
     os.makedirs('static/thumbnails', exist_ok=True)
     os.makedirs('static/thumbnails/upscaled', exist_ok=True)
 
+def env_number(name, default, minimum, allow_minimum=True):
+    """Read a numeric setting from the environment, falling back to default if invalid."""
+    raw_value = os.environ.get(name)
+    if raw_value is None:
+        return default
+    try:
+        value = float(raw_value)
+        if not math.isfinite(value):
+            raise ValueError("must be a finite number")
+        if value < minimum or (value == minimum and not allow_minimum):
+            raise ValueError(f"must be {'>=' if allow_minimum else '>'} {minimum}")
+        return value
+    except ValueError as e:
+        print(f"Invalid {name}={raw_value!r} ({str(e)}), using default {default}")
+        return default
+
+# Bounded thumbnail storage: files are sharded by video ID and the least
+# recently used ones are evicted in the background once over quota
+thumbnail_storage = ThumbnailStorage(
+    root=os.path.join('static', 'thumbnails'),
+    index_path='thumbnail_index.json',
+    max_bytes=int(env_number('THUMBNAIL_STORAGE_QUOTA_MB', 500, minimum=0) * 1024 * 1024),
+    cleanup_interval=env_number('THUMBNAIL_CLEANUP_INTERVAL', 60, minimum=0, allow_minimum=False)
+)
+
+@app.before_request
+def start_thumbnail_cleanup():
+    # Started lazily so only the process that serves requests runs the
+    # cleanup thread (not the debug reloader's parent, nor a bare import)
+    thumbnail_storage.start()
+
+def fetch_thumbnail(video_url):
+    """Download a thumbnail into its storage shard and register it."""
+    video_id = extract_video_id(video_url)
+    if not video_id:
+        raise ValueError("Could not extract video ID from the provided URL")
+
+    thumbnail_path = download_thumbnail(video_url, output_dir=thumbnail_storage.shard_dir(video_id))
+    thumbnail_storage.register(thumbnail_path)
+    return video_id, thumbnail_path
+
+def static_url(path):
+    """Return the /static URL for a file stored under the static folder."""
+    return f"/static/{os.path.relpath(path, 'static').replace(os.sep, '/')}"
+
 @app.route('/api/summarize', methods=['POST'])
 def summarize_video():
     try:
@@ -72,7 +121,7 @@ def get_thumbnail():
             return jsonify({'error': 'Missing video URL'}), 400
         
         # Download the thumbnail
-        thumbnail_path = download_thumbnail(video_url)
+        _, thumbnail_path = fetch_thumbnail(video_url)
         
         # Return the file
         return send_file(thumbnail_path, mimetype='image/jpeg')
@@ -90,13 +139,13 @@ def download_video_thumbnail():
             return jsonify({'error': 'Missing video URL'}), 400
             
         # Download the high-quality thumbnail
-        thumbnail_path = download_thumbnail(video_url)
+        _, thumbnail_path = fetch_thumbnail(video_url)
         
         # Return the path to the saved thumbnail
         return jsonify({
             'success': True,
             'thumbnail_path': thumbnail_path,
-            'url': f"/static/thumbnails/{os.path.basename(thumbnail_path)}"
+            'url': static_url(thumbnail_path)
         })
         
     except Exception as e:
@@ -114,18 +163,24 @@ def upscale_video_thumbnail():
             return jsonify({'error': 'Missing video URL'}), 400
             
         # First download the thumbnail if not already downloaded
-        thumbnail_path = download_thumbnail(video_url)
+        video_id, thumbnail_path = fetch_thumbnail(video_url)
         
         # Then upscale it
-        upscaled_path = upscale_thumbnail(thumbnail_path, scale_factor, target_resolution=target_resolution)
+        upscaled_path = upscale_thumbnail(
+            thumbnail_path,
+            scale_factor,
+            output_dir=thumbnail_storage.shard_dir(video_id, 'upscaled'),
+            target_resolution=target_resolution
+        )
+        thumbnail_storage.register(upscaled_path)
         
         # Return the path to the upscaled thumbnail
         return jsonify({
             'success': True,
             'original_thumbnail_path': thumbnail_path,
             'upscaled_thumbnail_path': upscaled_path,
-            'original_url': f"/static/thumbnails/{os.path.basename(thumbnail_path)}",
-            'upscaled_url': f"/static/{os.path.relpath(upscaled_path, 'static')}",
+            'original_url': static_url(thumbnail_path),
+            'upscaled_url': static_url(upscaled_path),
             'resolution': target_resolution or f"{scale_factor}x"
         })
         
@@ -136,10 +191,28 @@ def upscale_video_thumbnail():
 def health_check():
     return jsonify({'status': 'healthy'})
 
+@app.route('/api/admin/storage', methods=['GET'])
+def storage_stats():
+    # Admin endpoints are disabled unless ADMIN_TOKEN is configured
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Admin endpoints are disabled'}), 403
+
+    provided_token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(provided_token.encode('utf-8'), admin_token.encode('utf-8')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify(thumbnail_storage.stats())
+
 # Make the static folder accessible
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    return send_file(os.path.join('static', filename))
+    # Never serve hidden files such as leftover index or temp files
+    if any(part.startswith('.') for part in filename.split('/')):
+        return jsonify({'error': 'Not found'}), 404
+
+    thumbnail_storage.touch(os.path.join('static', filename))
+    return send_from_directory('static', filename)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class ThumbnailStorage:
+    """
+    Bounded on-disk storage for downloaded and upscaled thumbnails.
+
+    Files are sharded into hashed subdirectories by video ID and tracked in a
+    small JSON index (size and last-access time). When the total size goes over
+    the configured quota, a background thread evicts the least recently used
+    files until usage drops back under the low-water mark.
+
+    Shard directories are never removed, even when empty: writers get their
+    directory from shard_dir() before a slow download or resize, and pruning
+    it underneath them would make the write fail. The tree is bounded at 256
+    entries per level, so directory listings stay fast.
+
+    The index is per process: with several gunicorn workers each worker keeps
+    its own view, and files it does not know about are picked up on the next
+    startup scan.
+    """
+
+    def __init__(self, root='static/thumbnails', max_bytes=500 * 1024 * 1024,
+                 cleanup_interval=60, low_water_ratio=0.9, index_path=None):
+        """
+        Args:
+            root (str): Directory that holds all thumbnails
+            max_bytes (int): Byte quota for everything under root
+            cleanup_interval (int): Seconds between background cleanup passes
+            low_water_ratio (float): Fraction of max_bytes to evict down to
+            index_path (str): Where to keep the JSON index; defaults to a file
+                next to root so it is never served along with the thumbnails
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.cleanup_interval = cleanup_interval
+        self.low_water_bytes = int(max_bytes * low_water_ratio)
+        self.index_path = index_path or f"{os.path.normpath(root)}.index.json"
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._entries = {}
+        self._total_bytes = 0
+        self._dirty = False
+        self._stats = {
+            'hits': 0,
+            'registered': 0,
+            'evicted_files': 0,
+            'evicted_bytes': 0,
+            'cleanup_runs': 0,
+            'last_cleanup': None,
+        }
+
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def shard_for(video_id):
+        """Return the two-level hashed shard (e.g. 'ab/cd') for a video ID."""
+        digest = hashlib.sha1(video_id.encode('utf-8')).hexdigest()
+        return os.path.join(digest[:2], digest[2:4])
+
+    def shard_dir(self, video_id, subdir=''):
+        """
+        Return (and create) the directory a video's thumbnails should go in.
+
+        Args:
+            video_id (str): YouTube video ID
+            subdir (str): Optional category below root, e.g. 'upscaled'
+
+        Returns:
+            str: Path to the sharded directory
+        """
+        path = os.path.join(self.root, subdir, self.shard_for(video_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _key(self, path):
+        key = os.path.relpath(path, self.root)
+        if key.startswith(os.pardir):
+            return None
+        return key
+
+    def register(self, path):
+        """Record a newly written file and wake the cleanup thread if over quota."""
+        key = self._key(path)
+        if key is None:
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous:
+                self._total_bytes -= previous['size']
+            self._entries[key] = {'size': size, 'last_access': time.time()}
+            self._total_bytes += size
+            self._stats['registered'] += 1
+            self._dirty = True
+            over_quota = self._total_bytes > self.max_bytes
+
+        if over_quota:
+            self._wakeup.set()
+
+    def touch(self, path):
+        """Update the last-access time of a tracked file."""
+        key = self._key(path)
+        if key is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry['last_access'] = time.time()
+                self._stats['hits'] += 1
+                self._dirty = True
+
+    def stats(self):
+        """Return a snapshot of the storage usage and eviction counters."""
+        with self._lock:
+            return {
+                'root': self.root,
+                'file_count': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'low_water_bytes': self.low_water_bytes,
+                'usage_ratio': round(self._total_bytes / self.max_bytes, 4) if self.max_bytes else None,
+                'cleanup_interval': self.cleanup_interval,
+                'cleanup_thread_alive': bool(self._thread and self._thread.is_alive()),
+                **self._stats,
+            }
+
+    def start(self):
+        """Start the background cleanup thread (idempotent)."""
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='thumbnail-storage-cleanup', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the background cleanup thread and wait for it to exit."""
+        with self._thread_lock:
+            thread = self._thread
+            self._thread = None
+            self._stopping.set()
+            self._wakeup.set()
+        if thread:
+            thread.join(timeout)
+
+    def cleanup(self):
+        """
+        Evict least recently used files until usage is under the low-water mark,
+        then flush the index to disk.
+
+        Returns:
+            int: Number of files evicted
+        """
+        with self._lock:
+            victims = []
+            if self._total_bytes > self.max_bytes:
+                by_age = sorted(self._entries.items(), key=lambda item: item[1]['last_access'])
+                remaining = self._total_bytes
+                for key, entry in by_age:
+                    if remaining <= self.low_water_bytes:
+                        break
+                    victims.append((key, entry))
+                    remaining -= entry['size']
+
+                for key, _ in victims:
+                    entry = self._entries.pop(key)
+                    self._total_bytes -= entry['size']
+                if victims:
+                    self._dirty = True
+
+            decided_at = time.time()
+            self._stats['cleanup_runs'] += 1
+            self._stats['last_cleanup'] = decided_at
+
+        # Files are removed without holding the lock so register()/touch()
+        # never wait on disk I/O
+        evicted = 0
+        for key, entry in victims:
+            if self._evict(key, entry['size'], decided_at):
+                evicted += 1
+
+        if evicted:
+            print(f"Evicted {evicted} thumbnails to stay under the storage quota")
+
+        self._save_index()
+        return evicted
+
+    def _evict(self, key, size, decided_at):
+        """
+        Remove an evicted file, unless it was re-registered or rewritten after
+        the eviction decision.
+
+        Returns:
+            bool: True if the file was removed
+        """
+        path = os.path.join(self.root, key)
+        with self._lock:
+            if key in self._entries:
+                return False
+
+        try:
+            if os.stat(path).st_mtime > decided_at:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"Error evicting thumbnail {key}: {str(e)}")
+            return False
+
+        with self._lock:
+            self._stats['evicted_files'] += 1
+            self._stats['evicted_bytes'] += size
+            re_registered = key in self._entries
+
+        # A re-download registered while we were unlinking may have been the
+        # file we just removed; drop the entry if nothing is left on disk
+        if re_registered and not os.path.exists(path):
+            self._forget(key)
+        return True
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._total_bytes -= entry['size']
+                self._dirty = True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.cleanup_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self.cleanup()
+            except Exception as e:
+                print(f"Error in thumbnail storage cleanup: {str(e)}")
+
+    def _load_index(self):
+        """Load the index and reconcile it with the files actually on disk."""
+        entries = {}
+        try:
+            with open(self.index_path, 'r') as f:
+                entries = json.load(f).get('entries', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Could not read thumbnail index, rebuilding: {str(e)}")
+
+        on_disk = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                key = os.path.relpath(path, self.root)
+                last_access = entries.get(key, {}).get('last_access', stat.st_mtime)
+                on_disk[key] = {'size': stat.st_size, 'last_access': last_access}
+
+        self._entries = on_disk
+        self._total_bytes = sum(entry['size'] for entry in on_disk.values())
+        self._dirty = on_disk != entries
+        if self._total_bytes > self.max_bytes:
+            self._wakeup.set()
+
+    def _save_index(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {key: dict(entry) for key, entry in self._entries.items()}
+            self._dirty = False
+
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'entries': snapshot}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Error writing thumbnail index: {str(e)}")
+            with self._lock:
+                self._dirty = True
@@ -0,0 +1,205 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+
+def import_app():
+    sys.modules.pop('app', None)
+    return importlib.import_module('app')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # app.py creates its static directories relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    app_module = import_app()
+    monkeypatch.setattr(app_module.app, 'root_path', str(tmp_path))
+    app_module.app.config['TESTING'] = True
+
+    with app_module.app.test_client() as client:
+        yield client, app_module
+
+    app_module.thumbnail_storage.stop()
+    sys.modules.pop('app', None)
+
+
+@pytest.mark.parametrize('interval, quota', [('0', '-1'), ('-5', 'lots'), ('soon', 'nan')])
+def test_invalid_storage_settings_fall_back_to_defaults(tmp_path, monkeypatch, interval, quota):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('THUMBNAIL_CLEANUP_INTERVAL', interval)
+    monkeypatch.setenv('THUMBNAIL_STORAGE_QUOTA_MB', quota)
+
+    app_module = import_app()
+    sys.modules.pop('app', None)
+
+    assert app_module.thumbnail_storage.cleanup_interval == 60
+    assert app_module.thumbnail_storage.max_bytes == 500 * 1024 * 1024
+
+
+def test_valid_storage_settings_are_used(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('THUMBNAIL_CLEANUP_INTERVAL', '0.5')
+    monkeypatch.setenv('THUMBNAIL_STORAGE_QUOTA_MB', '0')
+
+    app_module = import_app()
+    sys.modules.pop('app', None)
+
+    assert app_module.thumbnail_storage.cleanup_interval == 0.5
+    assert app_module.thumbnail_storage.max_bytes == 0
+
+
+VIDEO_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+
+@pytest.fixture
+def fake_thumbnails(client, monkeypatch):
+    client, app_module = client
+
+    def download_thumbnail(url, output_dir='static/thumbnails'):
+        path = os.path.join(output_dir, f"{app_module.extract_video_id(url)}.jpg")
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xd8original')
+        return path
+
+    def upscale_thumbnail(input_path, scale_factor=2, output_dir='static/thumbnails/upscaled', target_resolution=None):
+        base_name, ext = os.path.splitext(os.path.basename(input_path))
+        path = os.path.join(output_dir, f"{base_name}_upscaled_{target_resolution}_7680x4320{ext}")
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xd8upscaled!')
+        return path
+
+    monkeypatch.setattr(app_module, 'download_thumbnail', download_thumbnail)
+    monkeypatch.setattr(app_module, 'upscale_thumbnail', upscale_thumbnail)
+    return client, app_module
+
+
+def test_download_thumbnail_is_sharded_registered_and_served(fake_thumbnails):
+    client, app_module = fake_thumbnails
+    storage = app_module.thumbnail_storage
+    shard = storage.shard_for('dQw4w9WgXcQ').replace(os.sep, '/')
+
+    response = client.post('/api/download-thumbnail', json={'video_url': VIDEO_URL})
+
+    assert response.status_code == 200
+    url = response.get_json()['url']
+    assert url == f"/static/thumbnails/{shard}/dQw4w9WgXcQ.jpg"
+    assert storage.stats()['file_count'] == 1
+    assert storage.stats()['total_bytes'] == len(b'\xff\xd8original')
+
+    served = client.get(url)
+    assert served.status_code == 200
+    assert served.data == b'\xff\xd8original'
+    assert storage.stats()['hits'] == 1
+
+
+def test_upscale_thumbnail_is_sharded_registered_and_served(fake_thumbnails):
+    client, app_module = fake_thumbnails
+    storage = app_module.thumbnail_storage
+    shard = storage.shard_for('dQw4w9WgXcQ').replace(os.sep, '/')
+
+    response = client.post('/api/upscale-thumbnail', json={'video_url': VIDEO_URL, 'target_resolution': '8K'})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['original_url'] == f"/static/thumbnails/{shard}/dQw4w9WgXcQ.jpg"
+    assert data['upscaled_url'] == f"/static/thumbnails/upscaled/{shard}/dQw4w9WgXcQ_upscaled_8K_7680x4320.jpg"
+    assert storage.stats()['file_count'] == 2
+
+    assert client.get(data['original_url']).data == b'\xff\xd8original'
+    assert client.get(data['upscaled_url']).data == b'\xff\xd8upscaled!'
+    assert storage.stats()['hits'] == 2
+
+
+def test_thumbnail_endpoint_registers_download(fake_thumbnails):
+    client, app_module = fake_thumbnails
+
+    response = client.get('/api/thumbnail', query_string={'url': VIDEO_URL})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.data == b'\xff\xd8original'
+    assert app_module.thumbnail_storage.stats()['file_count'] == 1
+
+
+def test_thumbnail_endpoints_reject_invalid_url(fake_thumbnails):
+    client, app_module = fake_thumbnails
+
+    response = client.post('/api/download-thumbnail', json={'video_url': 'not a video'})
+
+    assert response.status_code == 500
+    assert app_module.thumbnail_storage.stats()['file_count'] == 0
+
+
+def test_serving_thumbnail_updates_last_access(client):
+    client, app_module = client
+    storage = app_module.thumbnail_storage
+    path = os.path.join(storage.shard_dir('dQw4w9WgXcQ'), 'dQw4w9WgXcQ.jpg')
+    with open(path, 'wb') as f:
+        f.write(b'\xff\xd8jpeg')
+    storage.register(path)
+    key = os.path.relpath(path, storage.root)
+    storage._entries[key]['last_access'] = 0
+
+    response = client.get(app_module.static_url(path))
+
+    assert response.status_code == 200
+    assert response.data == b'\xff\xd8jpeg'
+    assert storage.stats()['hits'] == 1
+    assert storage._entries[key]['last_access'] > 0
+
+
+def test_static_does_not_serve_index_or_dotfiles(client):
+    client, app_module = client
+    storage = app_module.thumbnail_storage
+    assert not os.path.abspath(storage.index_path).startswith(os.path.abspath('static'))
+
+    # A leftover index from older versions lived inside the static tree
+    with open(os.path.join('static', 'thumbnails', '.index.json'), 'w') as f:
+        f.write('{"entries": {}}')
+
+    assert client.get('/static/thumbnails/.index.json').status_code == 404
+
+
+def test_static_rejects_paths_outside_static(client):
+    client, _ = client
+    assert client.get('/static/../app.py').status_code == 404
+
+
+def test_cleanup_thread_starts_on_first_request(client):
+    client, app_module = client
+    assert not app_module.thumbnail_storage.stats()['cleanup_thread_alive']
+
+    client.get('/api/health')
+
+    assert app_module.thumbnail_storage.stats()['cleanup_thread_alive']
+
+
+def test_admin_storage_disabled_without_token(client, monkeypatch):
+    client, _ = client
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+
+    assert client.get('/api/admin/storage').status_code == 403
+
+
+def test_admin_storage_requires_matching_token(client, monkeypatch):
+    client, _ = client
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+
+    assert client.get('/api/admin/storage').status_code == 401
+    assert client.get('/api/admin/storage', headers={'X-Admin-Token': 'wrong'}).status_code == 401
+
+
+def test_admin_storage_returns_stats(client, monkeypatch):
+    client, _ = client
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+
+    response = client.get('/api/admin/storage', headers={'X-Admin-Token': 'secret'})
+
+    assert response.status_code == 200
+    stats = response.get_json()
+    assert stats['file_count'] == 0
+    assert stats['total_bytes'] == 0
+    assert 'max_bytes' in stats
+    assert 'evicted_files' in stats
@@ -0,0 +1,252 @@
+import json
+import os
+import time
+
+import pytest
+
+from storage_manager import ThumbnailStorage
+
+
+def write_file(storage, video_id, size, subdir=''):
+    path = os.path.join(storage.shard_dir(video_id, subdir), f"{video_id}.jpg")
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    storage.register(path)
+    # Keep last-access times strictly ordered
+    time.sleep(0.01)
+    return path
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / 'thumbnails')
+
+
+def test_shard_dir_is_stable_and_nested(root):
+    storage = ThumbnailStorage(root=root)
+    path = storage.shard_dir('dQw4w9WgXcQ', 'upscaled')
+
+    assert os.path.isdir(path)
+    assert path == storage.shard_dir('dQw4w9WgXcQ', 'upscaled')
+    assert os.path.relpath(path, root).split(os.sep)[0] == 'upscaled'
+    assert len(os.path.relpath(path, root).split(os.sep)) == 3
+
+
+def test_register_tracks_size(root):
+    storage = ThumbnailStorage(root=root, max_bytes=10000)
+    write_file(storage, 'video000001', 1000)
+    write_file(storage, 'video000002', 500, subdir='upscaled')
+
+    stats = storage.stats()
+    assert stats['file_count'] == 2
+    assert stats['total_bytes'] == 1500
+    assert stats['registered'] == 2
+
+
+def test_register_ignores_paths_outside_root(root, tmp_path):
+    storage = ThumbnailStorage(root=root)
+    outside = tmp_path / 'elsewhere.jpg'
+    outside.write_bytes(b'x' * 10)
+    storage.register(str(outside))
+
+    assert storage.stats()['file_count'] == 0
+
+
+def test_cleanup_evicts_least_recently_used(root):
+    storage = ThumbnailStorage(root=root, max_bytes=3000, low_water_ratio=0.9)
+    paths = [write_file(storage, f"video00000{i}", 1000) for i in range(3)]
+
+    # Accessing the oldest file should protect it from eviction
+    storage.touch(paths[0])
+    newest = write_file(storage, 'video000003', 1000)
+
+    assert storage.cleanup() == 2
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert not os.path.exists(paths[2])
+    assert os.path.exists(newest)
+
+    stats = storage.stats()
+    assert stats['total_bytes'] == 2000
+    assert stats['evicted_files'] == 2
+    assert stats['evicted_bytes'] == 2000
+    assert stats['hits'] == 1
+
+
+def test_cleanup_under_quota_is_noop(root):
+    storage = ThumbnailStorage(root=root, max_bytes=10000)
+    path = write_file(storage, 'video000001', 1000)
+
+    assert storage.cleanup() == 0
+    assert os.path.exists(path)
+    assert storage.stats()['cleanup_runs'] == 1
+
+
+def test_eviction_keeps_shard_dir_for_in_flight_writes(root):
+    storage = ThumbnailStorage(root=root, max_bytes=1500, low_water_ratio=0.7)
+    old = write_file(storage, 'video000001', 1000, subdir='upscaled')
+
+    # A slow upscale of the same video picks its directory before writing
+    out_dir = storage.shard_dir('video000001', 'upscaled')
+    write_file(storage, 'video000002', 1000)
+    assert storage.cleanup() == 1
+    assert not os.path.exists(old)
+
+    new_path = os.path.join(out_dir, 'video000001_upscaled_8K.jpg')
+    with open(new_path, 'wb') as f:
+        f.write(b'x' * 100)
+    storage.register(new_path)
+
+    assert storage.stats()['file_count'] == 2
+
+
+def test_evict_skips_re_registered_file(root):
+    storage = ThumbnailStorage(root=root)
+    path = write_file(storage, 'video000001', 1000)
+    key = os.path.relpath(path, root)
+
+    # Simulate a re-download landing between the eviction decision and unlink
+    decided_at = time.time()
+    entry = storage._entries.pop(key)
+    storage._total_bytes -= entry['size']
+    storage.register(path)
+
+    assert not storage._evict(key, entry['size'], decided_at)
+    assert os.path.exists(path)
+    assert storage.stats()['total_bytes'] == 1000
+
+
+def test_evict_does_not_hold_lock_during_unlink(root, monkeypatch):
+    storage = ThumbnailStorage(root=root)
+    path = write_file(storage, 'video000001', 1000)
+    key = os.path.relpath(path, root)
+    entry = storage._entries.pop(key)
+    storage._total_bytes -= entry['size']
+
+    real_remove = os.remove
+    lock_states = []
+
+    def remove(target):
+        lock_states.append(storage._lock.locked())
+        real_remove(target)
+
+    monkeypatch.setattr(os, 'remove', remove)
+
+    assert storage._evict(key, entry['size'], time.time())
+    assert lock_states == [False]
+    assert not os.path.exists(path)
+
+
+def test_evict_drops_phantom_entry_registered_during_unlink(root, monkeypatch):
+    storage = ThumbnailStorage(root=root)
+    path = write_file(storage, 'video000001', 1000)
+    key = os.path.relpath(path, root)
+    entry = storage._entries.pop(key)
+    storage._total_bytes -= entry['size']
+
+    real_remove = os.remove
+
+    def remove(target):
+        # A concurrent re-download registers just before the unlink lands
+        storage.register(target)
+        real_remove(target)
+
+    monkeypatch.setattr(os, 'remove', remove)
+
+    assert storage._evict(key, entry['size'], time.time())
+    assert storage.stats()['file_count'] == 0
+    assert storage.stats()['total_bytes'] == 0
+
+
+def test_background_thread_enforces_quota(root):
+    storage = ThumbnailStorage(root=root, max_bytes=1500, cleanup_interval=60)
+    storage.start()
+    write_file(storage, 'video000001', 1000)
+    write_file(storage, 'video000002', 1000)
+
+    deadline = time.time() + 5
+    while storage.stats()['total_bytes'] > 1500 and time.time() < deadline:
+        time.sleep(0.01)
+
+    stats = storage.stats()
+    storage.stop()
+    assert stats['cleanup_thread_alive']
+    assert stats['total_bytes'] == 1000
+
+
+def test_stop_shuts_down_thread(root):
+    storage = ThumbnailStorage(root=root, cleanup_interval=60)
+    storage.start()
+    thread = storage._thread
+    storage.start()
+    assert storage._thread is thread
+
+    storage.stop()
+
+    assert not thread.is_alive()
+    assert not storage.stats()['cleanup_thread_alive']
+
+    storage.start()
+    assert storage.stats()['cleanup_thread_alive']
+    storage.stop()
+
+
+def test_index_round_trip(root):
+    storage = ThumbnailStorage(root=root, max_bytes=10000)
+    path = write_file(storage, 'video000001', 1000)
+    storage.touch(path)
+    storage.cleanup()
+    last_access = storage._entries[os.path.relpath(path, root)]['last_access']
+
+    reloaded = ThumbnailStorage(root=root, max_bytes=10000)
+    stats = reloaded.stats()
+    assert stats['file_count'] == 1
+    assert stats['total_bytes'] == 1000
+    assert reloaded._entries[os.path.relpath(path, root)]['last_access'] == last_access
+
+
+def test_index_is_kept_outside_root(root):
+    storage = ThumbnailStorage(root=root, max_bytes=10000)
+    write_file(storage, 'video000001', 1000)
+    storage.cleanup()
+
+    assert os.path.exists(storage.index_path)
+    assert os.path.relpath(storage.index_path, root).startswith(os.pardir)
+
+
+def test_rebuilds_from_missing_index(root):
+    storage = ThumbnailStorage(root=root, max_bytes=10000)
+    write_file(storage, 'video000001', 1000)
+    write_file(storage, 'video000002', 200, subdir='upscaled')
+    assert not os.path.exists(storage.index_path)
+
+    reloaded = ThumbnailStorage(root=root, max_bytes=10000)
+    assert reloaded.stats()['file_count'] == 2
+    assert reloaded.stats()['total_bytes'] == 1200
+
+
+def test_rebuilds_from_corrupt_index(root):
+    storage = ThumbnailStorage(root=root, max_bytes=10000)
+    write_file(storage, 'video000001', 1000)
+    with open(storage.index_path, 'w') as f:
+        f.write('{not json')
+
+    reloaded = ThumbnailStorage(root=root, max_bytes=10000)
+    assert reloaded.stats()['file_count'] == 1
+    assert reloaded.stats()['total_bytes'] == 1000
+
+    reloaded.cleanup()
+    with open(reloaded.index_path) as f:
+        assert len(json.load(f)['entries']) == 1
+
+
+def test_reconcile_drops_entries_for_deleted_files(root):
+    storage = ThumbnailStorage(root=root, max_bytes=10000)
+    path = write_file(storage, 'video000001', 1000)
+    write_file(storage, 'video000002', 1000)
+    storage.cleanup()
+    os.remove(path)
+
+    reloaded = ThumbnailStorage(root=root, max_bytes=10000)
+    assert reloaded.stats()['file_count'] == 1
+    assert reloaded.stats()['total_bytes'] == 1000